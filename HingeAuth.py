@@ -1,34 +1,155 @@
 #!/usr/bin/env python3
 
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
+import os
 import uuid
 import time
-from typing import Dict, Any, Optional
+import logging
+import random
+import argparse
+import inspect
+import threading
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+# Retry options newer than the oldest urllib3 requests allows (other: 1.26, backoff_jitter: 2.0)
+RETRY_OPTIONAL = {
+    key: value for key, value in {'other': 0, 'backoff_jitter': 0.5}.items()
+    if key in inspect.signature(Retry).parameters
+}
+
+CREDENTIALS_PATH = os.path.join(os.path.expanduser("~"), ".config", "hinge-to-bearer", "creds.json")
+
+# (connect, read) timeouts in seconds for every API request
+REQUEST_TIMEOUT = (5, 30)
+
+# Auth responses are tiny JSON documents; anything larger is treated as hostile
+MAX_RESPONSE_BYTES = 64 * 1024
+
+# Client-side limit of RATE_LIMIT_REQUESTS per RATE_LIMIT_PERIOD seconds, per endpoint
+RATE_LIMIT_REQUESTS = 5
+RATE_LIMIT_PERIOD = 10.0
+
+# Upper bound in seconds on how long a Retry-After header can pause an endpoint
+MAX_RETRY_AFTER = 60.0
+
+# Seconds a freshly issued bearer token is reused from the credentials cache
+TOKEN_LIFETIME = 3300
+
+class _TokenBucket:
+    """Thread-safe token bucket allowing `capacity` requests per `period` seconds"""
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.last_ts = time.monotonic()
+        self.resume_at = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Take a token, sleeping until one is available"""
+        with self.lock:
+            wait = self.resume_at - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_ts) * self.rate)
+                self.last_ts = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                time.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, delay: float) -> None:
+        """Withhold all tokens for `delay` seconds"""
+        with self.lock:
+            self.resume_at = max(self.resume_at, time.monotonic() + delay)
 
 class HingeAuthenticator:
-    def __init__(self):
+    BASE_URL = "https://prod-api.hingeaws.net"
+    URL_INSTALL = BASE_URL + "/identity/install"
+    URL_SMS_INIT = BASE_URL + "/auth/sms/v2/initiate"
+    URL_SMS_V2 = BASE_URL + "/auth/sms/v2"
+    URL_DEVICE_VALIDATE = BASE_URL + "/auth/device/validate"
+
+    # Seconds a successful install POST is trusted before it is sent again
+    INSTALL_TTL = 3600
+
+    def __init__(self, phone_number: Optional[str] = None, credentials_path: Optional[str] = CREDENTIALS_PATH):
 
-        self.base_url = "https://prod-api.hingeaws.net"
+        self.phone_number = phone_number
+        self.credentials_path = credentials_path
         self.session = requests.Session()
+
+        # Every call goes to the same host, so keep a single pooled connection alive.
+        # Only connection failures are retried here, since nothing reached the server;
+        # OTP submissions are not idempotent, so read errors and statuses are never replayed.
+        retry = Retry(
+            total=3,
+            connect=3,
+            read=0,
+            status=0,
+            backoff_factor=1.0,
+            **RETRY_OPTIONAL
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, pool_block=False, max_retries=retry)
+        self.session.mount(self.BASE_URL, adapter)
+
+        # Separate buckets so a burst against one endpoint cannot starve the others
+        self._buckets = {
+            url: _TokenBucket(RATE_LIMIT_REQUESTS, RATE_LIMIT_PERIOD)
+            for url in (self.URL_INSTALL, self.URL_SMS_INIT, self.URL_SMS_V2, self.URL_DEVICE_VALIDATE)
+        }
         
-        # Generate session identifiers
-        self.session_id = self._generate_uuid()
-        self.device_id = self._generate_uuid()
-        self.install_id = self._generate_uuid()
+        # Reuse identifiers from a previous run for the same number, otherwise generate fresh ones
+        self._credentials = self._load_credentials()
+        if self._credentials:
+            self.session_id = self._credentials['session_id']
+            self.device_id = self._credentials['device_id']
+            self.install_id = self._credentials['install_id']
+            # The cached install ID was already registered by the run that saved it
+            self._install_done = True
+            self._install_ts = time.monotonic()
+        else:
+            raw = os.urandom(48)
+            self.session_id = self._format_uuid(raw[0:16])
+            self.device_id = self._format_uuid(raw[16:32])
+            self.install_id = self._format_uuid(raw[32:48])
+            self._install_done = False
+            self._install_ts = 0.0
+
+        # The identifiers never change, so serialize them into the payloads once
+        # and only splice in the per-call fields (JSON-encoded) at request time
+        device_id = orjson.dumps(self.device_id)
+        install_id = orjson.dumps(self.install_id)
+        self._install_payload = orjson.dumps({"installId": self.install_id})
+        self._sms_payload_tmpl = b'{"phoneNumber":%s,"deviceId":' + device_id + b'}'
+        self._otp_payload_tmpl = (
+            b'{"phoneNumber":%s,"deviceId":' + device_id
+            + b',"installId":' + install_id + b',"otp":%s}'
+        )
+        self._email_payload_tmpl = (
+            b'{"caseId":%s,"code":%s,"deviceId":' + device_id
+            + b',"installId":' + install_id + b'}'
+        )
         
-        print(f"Generated session identifiers:")
-        print(f"Session ID: {self.session_id}")
-        print(f"Device ID: {self.device_id}")
-        print(f"Install ID: {self.install_id}")
-    
-    def _generate_uuid(self) -> str:
-        """Generate a UUID in uppercase format"""
-        return str(uuid.uuid4()).upper()
-    
-    def _get_base_headers(self) -> Dict[str, str]:
-        """Get base headers for API requests"""
-        return {
+        logger.debug(
+            "Session identifiers: session=%s device=%s install=%s",
+            self.session_id, self.device_id, self.install_id
+        )
+
+        # Base headers are constant for the lifetime of the session
+        self.session.headers.update({
             'content-type': 'application/json',
             'x-device-platform': 'iOS',
             'user-agent': 'Hinge/11612 CFNetwork/3826.400.120 Darwin/24.3.0',
@@ -44,29 +165,182 @@ class HingeAuthenticator:
             'x-app-version': '9.78.0',
             'x-device-model': 'iPhone 13',
             'x-os-version': '18.3.1'
+        })
+    
+    def __enter__(self) -> "HingeAuthenticator":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
+    def close(self) -> None:
+        """Close the underlying session and release pooled connections"""
+        self.session.close()
+    
+    def _load_credentials(self) -> Optional[Dict[str, Any]]:
+        """Load cached identifiers and token from disk, if present, valid and for this phone number"""
+        if not self.credentials_path or self.phone_number is None:
+            return None
+        
+        try:
+            with open(self.credentials_path, 'rb') as f:
+                credentials = orjson.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, orjson.JSONDecodeError) as e:
+            logger.warning("Ignoring unreadable credentials cache %s: %s", self.credentials_path, e)
+            return None
+        
+        # The identifiers are spliced into request headers and payload templates,
+        # so only accept them in exactly the format _format_uuid produces
+        if not isinstance(credentials, dict) or not all(
+            self._is_uuid(credentials.get(key)) for key in ('session_id', 'device_id', 'install_id')
+        ):
+            logger.warning("Ignoring malformed credentials cache %s", self.credentials_path)
+            return None
+        
+        if credentials.get('phone_number') != self.phone_number:
+            logger.debug("Credentials cache %s belongs to another phone number", self.credentials_path)
+            return None
+        
+        return credentials
+    
+    def _is_uuid(self, value: Any) -> bool:
+        """Check that a value is an uppercase dashed UUID string"""
+        if not isinstance(value, str):
+            return False
+        try:
+            return str(uuid.UUID(value)).upper() == value
+        except ValueError:
+            return False
+    
+    def _save_credentials(self, token: str) -> None:
+        """Write identifiers and bearer token to the credentials cache (mode 0600)"""
+        if not self.credentials_path or self.phone_number is None:
+            return
+        
+        credentials = {
+            'phone_number': self.phone_number,
+            'session_id': self.session_id,
+            'device_id': self.device_id,
+            'install_id': self.install_id,
+            'token': token,
+            'expires_at': time.time() + TOKEN_LIFETIME
         }
+        
+        try:
+            os.makedirs(os.path.dirname(self.credentials_path), mode=0o700, exist_ok=True)
+            fd = os.open(self.credentials_path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                # os.open only applies the mode to new files; fchmod is not available everywhere
+                if hasattr(os, 'fchmod'):
+                    os.fchmod(fd, 0o600)
+                f.write(orjson.dumps(credentials))
+        except Exception as e:
+            # Caching is best effort and must never cost the caller an already issued token
+            logger.warning("Could not write credentials cache %s: %s", self.credentials_path, e)
+            return
+        
+        self._credentials = credentials
+    
+    def cached_token(self) -> Optional[str]:
+        """
+        Get the bearer token from the credentials cache
+        
+        Returns:
+            str: Cached bearer token if it has not expired, None otherwise
+        """
+        if not self._credentials:
+            return None
+        
+        token = self._credentials.get('token')
+        expires_at = self._credentials.get('expires_at')
+        if isinstance(token, str) and isinstance(expires_at, (int, float)) and expires_at > time.time():
+            return token
+        return None
+    
+    def _format_uuid(self, raw: bytes) -> str:
+        """Format 16 random bytes as an uppercase version 4 UUID"""
+        b = bytearray(raw)
+        b[6] = b[6] & 0x0f | 0x40
+        b[8] = b[8] & 0x3f | 0x80
+        h = b.hex().upper()
+        return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+    
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff delay with jitter for the given attempt"""
+        return 2 ** attempt * (1 + random.random() * 0.5)
+    
+    def _post(self, url: str, payload: bytes) -> Tuple[requests.Response, bytes]:
+        """POST a JSON payload and read at most MAX_RESPONSE_BYTES of the response body"""
+        self._buckets[url].acquire()
+        response = self.session.post(url, data=payload, timeout=REQUEST_TIMEOUT, stream=True)
+        try:
+            body = response.raw.read(MAX_RESPONSE_BYTES + 1, decode_content=True)
+        finally:
+            response.close()
+        
+        if len(body) > MAX_RESPONSE_BYTES:
+            raise ValueError(f"Response from {url} exceeds {MAX_RESPONSE_BYTES} bytes")
+        
+        if response.status_code == 429:
+            # Hold off further calls to this endpoint until the server says we may retry
+            delay = self._retry_after(response)
+            logger.warning("Rate limited by %s, pausing requests for %.1fs", url, delay)
+            self._buckets[url].pause(delay)
+        return response, body
+    
+    def _retry_after(self, response: requests.Response) -> float:
+        """Seconds to wait according to a Retry-After header, falling back to the bucket period"""
+        header = response.headers.get('retry-after')
+        if not header:
+            return RATE_LIMIT_PERIOD
+        
+        try:
+            delay = float(header)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(header).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return RATE_LIMIT_PERIOD
+        return min(max(delay, 0.0), MAX_RETRY_AFTER)
     
     def _init_auth(self) -> bool:
-        """Initialize authentication by posting install ID"""
-        print("Initializing authentication...")
+        """Initialize authentication by posting install ID, at most once per TTL"""
+        if self._install_done and time.monotonic() - self._install_ts < self.INSTALL_TTL:
+            return True
+        
+        logger.debug("Initializing authentication...")
         
         try:
-            url = f"{self.base_url}/identity/install"
-            headers = self._get_base_headers()
-            payload = {"installId": self.install_id}
+            url = self.URL_INSTALL
+            payload = self._install_payload
             
-            print(f"Request URL: {url}")
-            print(f"Request headers: {headers}")
-            print(f"Request payload: {payload}")
+            logger.debug("Request URL: %s", url)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Request payload: %s", payload.decode('utf-8', 'replace'))
             
-            response = self.session.post(url, headers=headers, json=payload, timeout=30)
-            print(f"Init auth status: {response.status_code}")
-            print(f"Init auth response: {response.text}")
+            # Posting the install ID is idempotent, so transient statuses are safe to retry.
+            # Connection failures are already retried by the session adapter.
+            attempts = 3
+            for attempt in range(attempts):
+                response, body = self._post(url, payload)
+                if response.status_code not in RETRY_STATUSES or attempt == attempts - 1:
+                    break
+                logger.warning("Init auth attempt %d returned %s", attempt + 1, response.status_code)
+                time.sleep(self._backoff_delay(attempt))
+            logger.debug("Init auth status: %s", response.status_code)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Init auth response: %s", body.decode('utf-8', 'replace'))
             
-            return response.status_code in [200, 201, 204]
+            if response.status_code in [200, 201, 204]:
+                self._install_done = True
+                self._install_ts = time.monotonic()
+                return True
+            return False
         
         except Exception as e:
-            print(f"Error initializing auth: {e}")
+            logger.error("Error initializing auth: %s", e)
             return False
     
     def initiate_sms(self, phone_number: str) -> bool:
@@ -79,37 +353,35 @@ class HingeAuthenticator:
         Returns:
             bool: True if SMS was initiated successfully
         """
-        print(f"Initiating SMS for phone number: {phone_number}")
+        logger.info("Initiating SMS for phone number: %s", phone_number)
         
-        # Initialize auth first
+        # Initialize auth first (a no-op if the install was already posted)
         if not self._init_auth():
-            print("Failed to initialize authentication")
+            logger.error("Failed to initialize authentication")
             return False
         
         try:
-            url = f"{self.base_url}/auth/sms/v2/initiate"
-            headers = self._get_base_headers()
-            payload = {
-                "phoneNumber": phone_number,
-                "deviceId": self.device_id
-            }
+            url = self.URL_SMS_INIT
+            payload = self._sms_payload_tmpl % orjson.dumps(phone_number)
             
-            print(f"SMS Request URL: {url}")
-            print(f"SMS Request payload: {payload}")
+            logger.debug("SMS Request URL: %s", url)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("SMS Request payload: %s", payload.decode('utf-8', 'replace'))
             
-            response = self.session.post(url, headers=headers, json=payload, timeout=30)
-            print(f"SMS initiation status: {response.status_code}")
-            print(f"SMS initiation response: {response.text}")
+            response, body = self._post(url, payload)
+            logger.debug("SMS initiation status: %s", response.status_code)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("SMS initiation response: %s", body.decode('utf-8', 'replace'))
             
             if response.status_code in [200, 201, 204]:
-                print("SMS initiated successfully")
+                logger.info("SMS initiated successfully")
                 return True
             else:
-                print(f"SMS initiation failed with status {response.status_code}")
+                logger.error("SMS initiation failed with status %s", response.status_code)
                 return False
                 
         except Exception as e:
-            print(f"Error initiating SMS: {e}")
+            logger.error("Error initiating SMS: %s", e)
             return False
     
     def validate_otp(self, phone_number: str, otp: str) -> Optional[Dict[str, Any]]:
@@ -123,27 +395,26 @@ class HingeAuthenticator:
         Returns:
             dict: Response containing email and caseId if successful, None otherwise
         """
-        print("Validating OTP...")
+        logger.info("Validating OTP...")
+        
+        # The token issued at the end of this flow belongs to this number
+        self.phone_number = str(phone_number)
         
         try:
-            url = f"{self.base_url}/auth/sms/v2"
-            headers = self._get_base_headers()
-            payload = {
-                "phoneNumber": str(phone_number),
-                "deviceId": self.device_id,
-                "installId": self.install_id,
-                "otp": str(otp)
-            }
+            url = self.URL_SMS_V2
+            payload = self._otp_payload_tmpl % (orjson.dumps(str(phone_number)), orjson.dumps(str(otp)))
             
-            print(f"OTP validation payload: {payload}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("OTP validation payload: %s", payload.decode('utf-8', 'replace'))
             
-            response = self.session.post(url, headers=headers, json=payload, timeout=30)
-            print(f"OTP validation status: {response.status_code}")
-            print(f"OTP validation response: {response.text}")
+            response, body = self._post(url, payload)
+            logger.debug("OTP validation status: %s", response.status_code)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("OTP validation response: %s", body.decode('utf-8', 'replace'))
             
             try:
-                response_data = response.json()
-                print(f"Parsed OTP response: {response_data}")
+                response_data = orjson.loads(body)
+                logger.debug("Parsed OTP response: %s", response_data)
                 
                 if response.status_code == 412 and 'caseId' in response_data:
                     return {
@@ -151,15 +422,15 @@ class HingeAuthenticator:
                         'caseId': response_data.get('caseId')
                     }
                 else:
-                    print(f"OTP validation failed - status: {response.status_code}")
+                    logger.error("OTP validation failed - status: %s", response.status_code)
                     return None
                     
-            except json.JSONDecodeError:
-                print(f"Non-JSON response: {response.text}")
+            except orjson.JSONDecodeError:
+                logger.error("Non-JSON response: %s", body.decode('utf-8', 'replace'))
                 return None
                 
         except Exception as e:
-            print(f"Error validating OTP: {e}")
+            logger.error("Error validating OTP: %s", e)
             return None
     
     def validate_email_otp(self, case_id: str, email_code: str) -> Optional[str]:
@@ -173,77 +444,99 @@ class HingeAuthenticator:
         Returns:
             str: Bearer token if successful, None otherwise
         """
-        print("Validating email OTP...")
+        logger.info("Validating email OTP...")
         
         try:
-            url = f"{self.base_url}/auth/device/validate"
-            headers = self._get_base_headers()
-            payload = {
-                "caseId": case_id,
-                "code": email_code,
-                "deviceId": self.device_id,
-                "installId": self.install_id
-            }
+            url = self.URL_DEVICE_VALIDATE
+            payload = self._email_payload_tmpl % (orjson.dumps(case_id), orjson.dumps(email_code))
             
-            response = self.session.post(url, headers=headers, json=payload)
-            print(f"Email OTP validation status: {response.status_code}")
+            response, body = self._post(url, payload)
+            logger.debug("Email OTP validation status: %s", response.status_code)
             
             if response.status_code == 200:
-                response_data = response.json()
-                print("Email OTP validation successful!")
+                response_data = orjson.loads(body)
+                logger.info("Email OTP validation successful!")
                 
                 bearer_token = response_data.get('token')
-                if bearer_token:
-                    print(f"Bearer token obtained: {bearer_token}")
-                    return bearer_token
-                else:
-                    print("No token found in response")
+                if not bearer_token:
+                    logger.error("No token found in response")
                     return None
             else:
-                print(f"Email OTP validation failed: {response.text}")
+                logger.error("Email OTP validation failed: %s", body.decode('utf-8', 'replace'))
                 return None
                 
         except Exception as e:
-            print(f"Error validating email OTP: {e}")
+            logger.error("Error validating email OTP: %s", e)
             return None
+        
+        # The email OTP is spent at this point, so cache the token outside the try above
+        self._save_credentials(bearer_token)
+        return bearer_token
 
-def authenticate_hinge(phone_number: str) -> Optional[str]:
+def authenticate_hinge(phone_number: Optional[str] = None, force_reauth: bool = False) -> Optional[str]:
     """
     Complete authentication flow for Hinge
     
     Args:
-        phone_number: Phone number to authenticate with
+        phone_number: Phone number to authenticate with, prompted for if omitted
+        force_reauth: Ignore any cached bearer token and run the full OTP flow
         
     Returns:
         str: Bearer token if successful, None otherwise
     """
-    authenticator = HingeAuthenticator()
+    # The credentials cache belongs to a single phone number, so it can only be used once
+    # the number is known. With no cache there is nothing to match against, so a fresh
+    # install can be posted in the background while the user types their number.
+    prefetch_install = phone_number is None and not os.path.exists(CREDENTIALS_PATH)
+    if phone_number is None and not prefetch_install:
+        phone_number = input("Enter your phone number: ").strip()
 
-    if not authenticator.initiate_sms(phone_number):
-        print("Failed to initiate SMS")
-        return None
+    with HingeAuthenticator(phone_number) as authenticator:
+        if not force_reauth:
+            cached_token = authenticator.cached_token()
+            if cached_token:
+                logger.info("Using cached bearer token from %s", authenticator.credentials_path)
+                return cached_token
+
+        if prefetch_install:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                init_future = executor.submit(authenticator._init_auth)
+                phone_number = input("Enter your phone number: ").strip()
+                init_future.result()
+
+        if not authenticator.initiate_sms(phone_number):
+            print("Failed to initiate SMS")
+            return None
 
-    sms_otp = input("Enter the SMS OTP code: ").strip()
+        sms_otp = input("Enter the SMS OTP code: ").strip()
     
-    otp_result = authenticator.validate_otp(phone_number, sms_otp)
-    if not otp_result:
-        print("Failed to validate SMS OTP")
-        return None
+        otp_result = authenticator.validate_otp(phone_number, sms_otp)
+        if not otp_result:
+            print("Failed to validate SMS OTP")
+            return None
     
-    print(f"Email: {otp_result['email']}")
-    print(f"Case ID: {otp_result['caseId']}")
+        print(f"Email: {otp_result['email']}")
+        print(f"Case ID: {otp_result['caseId']}")
     
-    email_otp = input("Enter the email OTP code: ").strip()
+        email_otp = input("Enter the email OTP code: ").strip()
     
-    bearer_token = authenticator.validate_email_otp(otp_result['caseId'], email_otp)
+        bearer_token = authenticator.validate_email_otp(otp_result['caseId'], email_otp)
     
-    return bearer_token
+        return bearer_token
 
 if __name__ == "__main__":
 
-    phone_number = input("Enter your phone number: ").strip()
-    
-    token = authenticate_hinge(phone_number)
+    parser = argparse.ArgumentParser(description="Obtain a Hinge bearer token")
+    parser.add_argument(
+        "--force-reauth",
+        action="store_true",
+        help="ignore the cached bearer token and run the full OTP flow"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    token = authenticate_hinge(force_reauth=args.force_reauth)
     
     if token:
         print(f"\n✅ Authentication successful!")